@@ -39,7 +39,8 @@ class DimRed:
         priming=False,
         downsample=False,
         bin_factor=2,
-        output_dir="", 
+        output_dir="",
+        dtype=np.float64,
         psi=None
     ):
 
@@ -47,6 +48,11 @@ class DimRed:
         self.rank = self.comm.Get_rank()
         self.size = self.comm.Get_size()
 
+        # storage precision of the model and image blocks; float32 halves
+        # memory bandwidth and MPI payloads at reduced precision
+        self.dtype = np.dtype(dtype)
+        self.mpi_dtype = MPI.FLOAT if self.dtype == np.float32 else MPI.DOUBLE
+
         if psi is None:
             self.psi = PsanaInterface(exp=exp, run=run, det_type=det_type)
             self.psi.counter = start_offset
@@ -143,6 +149,49 @@ class DimRed:
 
         return num_images, num_components, batch_size, num_features
 
+    def report_interval_data(self):
+        """
+        Print a summary of recorded task durations on the root process.
+        """
+        if self.rank != 0 or not self.task_durations:
+            return
+
+        for task, durations in self.task_durations.items():
+            # materialize the duration list once and reduce in a single
+            # pass, rather than calling np.mean per statistic on the list
+            durations = np.fromiter(durations, np.float64, count=len(durations))
+            print(
+                "Task: {:35} Mean: {:.4e}s Total: {:.4e}s (n={})".format(
+                    task, durations.mean(), durations.sum(), durations.size
+                )
+            )
+
+    def save_interval_data(self, output_dir=None):
+        """
+        Write recorded task durations to a CSV file on the root process.
+
+        Parameters
+        ----------
+        output_dir : str, optional
+            Path to output directory, by default self.output_dir.
+        """
+        if self.rank != 0 or not self.task_durations:
+            return
+
+        if output_dir is None:
+            output_dir = self.output_dir
+
+        file_name = os.path.join(output_dir, "task_durations.csv")
+
+        with open(file_name, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["task", "iteration", "duration"])
+
+            for task, durations in self.task_durations.items():
+                writer.writerows(
+                    (task, i, duration) for i, duration in enumerate(durations)
+                )
+
     def display_dashboard(self):
         """
         Displays a pipca dashboard with a PC plot and intensity heatmap.
@@ -249,21 +298,11 @@ def distribute_indices_over_ranks(d, size):
         number of dimensions allocated per rank
     """
 
-    total_indices = 0
-    split_indices, split_counts = [0], []
-
-    for r in range(size):
-        num_per_rank = d // size
-        if r < (d % size):
-            num_per_rank += 1
-
-        split_counts.append(num_per_rank)
-
-        total_indices += num_per_rank
-        split_indices.append(total_indices)
+    split_counts = np.full(size, d // size, dtype=np.int64)
+    split_counts[: d % size] += 1
 
-    split_indices = np.array(split_indices)
-    split_counts = np.array(split_counts)
+    split_indices = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(split_counts, out=split_indices[1:])
 
     return split_indices, split_counts
 
@@ -266,7 +266,9 @@ class FreqDir(DimRed):
                 if self.increaseEll and canRankAdapt and self.rankAdapt:
                     self.ell = self.ell + rankAdapt_increaseAmount
                     self.m = 2*self.ell
-                    self.sketch = np.vstack((*self.sketch, np.zeros((2*rankAdapt_increaseAmount, self.d))))
+                    grownSketch = np.zeros((self.m, self.d))
+                    grownSketch[:self.sketch.shape[0], :] = self.sketch
+                    self.sketch = grownSketch
                     self.increaseEll = False
                     print("Increasing rank of process {} to {}".format(self.rank, self.ell))
                 else:
@@ -321,11 +323,11 @@ class FreqDir(DimRed):
             toShrink = sqrt(toShrink)
             toShrink[:int(self.ell*(1-self.alpha))] = sCopy[:int(self.ell*(1-self.alpha))]
             #self.sketch[:self.ell:,:] = dot(diag(toShrink), Vt[:self.ell,:]) #JOHN: Removed this extra colon 10/01/2023
-            self.sketch[:self.ell,:] = dot(diag(toShrink), Vt[:self.ell,:])
+            self.sketch[:self.ell,:] = toShrink[:, np.newaxis] * Vt[:self.ell,:]
             self.sketch[self.ell:,:] = 0
             self.nextZeroRow = self.ell
         else:
-            self.sketch[:ssize,:] = diag(s) @ Vt[:ssize,:]
+            self.sketch[:ssize,:] = S[:ssize, np.newaxis] * Vt[:ssize,:]
             self.sketch[ssize:,:] = 0
             self.nextZeroRow = ssize
 
@@ -5,6 +5,9 @@ from btx.processing.dimRed import *
 import os, csv, argparse
 
 import numpy as np
+from scipy.linalg import eigh, get_lapack_funcs
+from scipy.linalg import svd as scipy_svd
+from scipy.linalg.blas import dgemm, sgemm
 from mpi4py import MPI
 
 from matplotlib import pyplot as plt
@@ -19,6 +22,20 @@ import panel.widgets as pnw
 
 from btx.misc.shortcuts import TaskTimer
 
+# numba is optional: when present, the elementwise mean/variance merge
+# kernels are fused into single streaming passes over the d pixels
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# cupy is optional: when present and requested, the d-sized dense linear
+# algebra (centering, scaling, local QR, Q updates) runs on the GPU
+try:
+    import cupy
+except ImportError:
+    cupy = None
+
 from btx.interfaces.ipsana import (
     PsanaInterface,
     bin_data,
@@ -27,6 +44,29 @@ from btx.interfaces.ipsana import (
     assemble_image_stack_batch,
 )
 
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _combine_sample_mean(mu_n, mu_m, n, m, out):
+        """Merge two block means in one streaming pass over d pixels."""
+        inv_npm = 1.0 / (n + m)
+        for i in prange(mu_n.shape[0]):
+            out[i, 0] = (n * mu_n[i, 0] + m * mu_m[i, 0]) * inv_npm
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _combine_sample_variance(s_n, s_m, mu_n, mu_m, n, m, out):
+        """Merge two block sample variances in one streaming pass."""
+        inv_npm = 1.0 / (n + m)
+        inv_nm1 = 1.0 / (n + m - 1)
+        for i in prange(s_n.shape[0]):
+            diff = mu_n[i, 0] - mu_m[i, 0]
+            out[i, 0] = (
+                (n - 1) * s_n[i, 0]
+                + (m - 1) * s_m[i, 0]
+                + (n * m * diff * diff) * inv_npm
+            ) * inv_nm1
+
+
 class PiPCA(DimRed):
 
     """Parallelized Incremental Principal Component Analysis."""
@@ -44,6 +84,8 @@ class PiPCA(DimRed):
         downsample=False,
         bin_factor=2,
         output_dir="",
+        dtype=np.float64,
+        use_gpu=False,
     ):
         super().__init__(
         exp=exp,
@@ -57,6 +99,49 @@ class PiPCA(DimRed):
         downsample=downsample,
         bin_factor=bin_factor,
         output_dir=output_dir,
+        dtype=dtype,
+        )
+
+        # array module for the d-sized dense linear algebra: the model
+        # state and image blocks live on the GPU when cupy is available
+        # and requested, while MPI and the small R factor stay on the host
+        self.use_gpu = bool(use_gpu) and cupy is not None
+        self.xp = cupy if self.use_gpu else np
+
+        # bind the BLAS gemm handle matching the storage precision once,
+        # so hot-loop matrix products skip NumPy's operator dispatch layer
+        self._gemm = sgemm if self.dtype == np.float32 else dgemm
+
+        # reusable (local_d, q+m+1) QR input buffer, allocated on first
+        # update and kept between blocks of the same batch size; Fortran
+        # order lets LAPACK factor it in place without a layout copy
+        self._qr_input = None
+
+        # cached LAPACK QR routines and workspace sizes for the local
+        # factorization, keyed on the block shape
+        self._lapack_qr = None
+        self._lapack_qr_shape = None
+
+        # node-local and inter-node communicators for hierarchical
+        # collectives: large gathers/broadcasts funnel through one leader
+        # per node instead of hitting the root from every rank at once
+        self._node_comm = self.comm.Split_type(MPI.COMM_TYPE_SHARED)
+        self._node_rank = self._node_comm.Get_rank()
+        self._node_size = self._node_comm.Get_size()
+        self._leader_comm = self.comm.Split(
+            0 if self._node_rank == 0 else MPI.UNDEFINED, self.rank
+        )
+        if self._node_rank == 0:
+            self._node_sizes = np.array(
+                self._leader_comm.allgather(self._node_size), dtype=np.int64
+            )
+        else:
+            self._node_sizes = None
+
+        # specialize the update entry point per rank once, instead of
+        # branching on self.rank inside every block update
+        self.update_model = (
+            self._update_model_root if self.rank == 0 else self._update_model
         )
 
     def get_params(self):
@@ -141,10 +226,17 @@ class PiPCA(DimRed):
             )
             self.prime_model(img_batch)
         else:
-            self.U = np.zeros((self.split_counts[self.rank], self.num_components))
-            self.S = np.ones(self.num_components)
-            self.mu = np.zeros((self.split_counts[self.rank], 1))
-            self.total_variance = np.zeros((self.split_counts[self.rank], 1))
+            self.U = self.xp.zeros(
+                (self.split_counts[self.rank], self.num_components),
+                dtype=self.dtype,
+            )
+            self.S = self.xp.ones(self.num_components, dtype=self.dtype)
+            self.mu = self.xp.zeros(
+                (self.split_counts[self.rank], 1), dtype=self.dtype
+            )
+            self.total_variance = self.xp.zeros(
+                (self.split_counts[self.rank], 1), dtype=self.dtype
+            )
 
         # divide remaining number of images into batches
         # will become redundant in a streaming setting, need to change
@@ -196,7 +288,12 @@ class PiPCA(DimRed):
         num_valid_imgs, p, x, y = imgs.shape
         formatted_imgs = np.reshape(imgs, (num_valid_imgs, p * x * y)).T
 
-        return formatted_imgs[start_index:end_index, :]
+        # the transpose leaves each pixel row strided across memory; hand
+        # back a C-contiguous block so axis=1 reductions and BLAS calls
+        # stream rows at unit stride
+        return np.ascontiguousarray(
+            formatted_imgs[start_index:end_index, :], dtype=self.dtype
+        )
 
     def prime_model(self, X):
         """
@@ -208,6 +305,8 @@ class PiPCA(DimRed):
             set of n (d x 1) observations
         """
 
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+
         d, n = X.shape
 
         if self.rank == 0:
@@ -216,13 +315,20 @@ class PiPCA(DimRed):
 
         mu_full, total_variance_full = self.calculate_sample_mean_and_variance(X)
 
-        self.mu = mu_full[self.split_indices[self.rank]:self.split_indices[self.rank+1]]
-        self.total_variance = total_variance_full[self.split_indices[self.rank]:self.split_indices[self.rank+1]]
+        self.mu = self.to_device(
+            mu_full[self.split_indices[self.rank]:self.split_indices[self.rank+1]]
+        )
+        self.total_variance = self.to_device(
+            total_variance_full[self.split_indices[self.rank]:self.split_indices[self.rank+1]]
+        )
         
-        centered_data = X - np.tile(mu_full, n)
+        centered_data = X - mu_full
 
-        U, self.S, _ = np.linalg.svd(centered_data, full_matrices=False)
-        self.U = U[self.split_indices[self.rank]:self.split_indices[self.rank+1], :]
+        U, S, _ = np.linalg.svd(centered_data, full_matrices=False)
+        self.S = self.to_device(S)
+        self.U = self.to_device(
+            U[self.split_indices[self.rank]:self.split_indices[self.rank+1], :]
+        )
 
         self.num_incorporated_images += n
 
@@ -243,10 +349,35 @@ class PiPCA(DimRed):
 
         self.update_model(img_batch)
 
-    def update_model(self, X):
+    def _update_model_root(self, X):
+        """
+        Root-rank update entry point: report progress, then update.
+
+        Parameters
+        ----------
+        X : ndarray, shape (d x m)
+            batch of m (d x 1) observations
+        """
+        print(
+            "Factoring {m} sample{s} into {n} sample, {q} component model...".format(
+                m=X.shape[1],
+                s="s" if X.shape[1] > 1 else "",
+                n=self.num_incorporated_images,
+                q=self.num_components,
+            )
+        )
+
+        self._update_model(X)
+
+    def _update_model(self, X):
         """
         Update model with new batch of observations using iPCA.
 
+        Dispatched through self.update_model, which __init__ binds to
+        _update_model_root on rank 0 and directly to this method on all
+        other ranks, so the steady-state path carries no rank branch or
+        progress-string formatting.
+
         Parameters
         ----------
         X : ndarray, shape (d x m)
@@ -261,19 +392,14 @@ class PiPCA(DimRed):
         [1] Ross DA, Lim J, Lin RS, Yang MH. Incremental learning for robust visual tracking.
         International journal of computer vision. 2008 May;77(1):125-41.
         """
+        X = self.to_device(np.ascontiguousarray(X, dtype=self.dtype))
+
         _, m = X.shape
         n = self.num_incorporated_images
         q = self.num_components
 
         with TaskTimer(self.task_durations, "total update"):
 
-            if self.rank == 0:
-                print(
-                    "Factoring {m} sample{s} into {n} sample, {q} component model...".format(
-                        m=m, s="s" if m > 1 else "", n=n, q=q
-                    )
-                )
-
             with TaskTimer(self.task_durations, "record pc data"):
                 if n > 0:
                     self.record_loadings(X, q)
@@ -287,26 +413,28 @@ class PiPCA(DimRed):
                 )
                 self.mu = self.update_sample_mean(mu_n, mu_m, n, m)
 
+            with TaskTimer(self.task_durations, "QR input buffer"):
+                if self._qr_input is None or self._qr_input.shape[1] != q + m + 1:
+                    self._qr_input = self.xp.empty(
+                        (X.shape[0], q + m + 1), dtype=self.dtype, order="F"
+                    )
+                A = self._qr_input
+
             with TaskTimer(
                 self.task_durations, "center data and compute augment vector"
             ):
-                X_centered = X - np.tile(mu_m, m)
-                mean_augment_vector = np.sqrt(n * m / (n + m)) * (mu_m - mu_n)
-
-                X_augmented = np.hstack((X_centered, mean_augment_vector))
+                self.xp.subtract(X, mu_m, out=A[:, q : q + m])
+                A[:, q + m :] = np.sqrt(n * m / (n + m)) * (mu_m - mu_n)
 
-            with TaskTimer(self.task_durations, "first matrix product U@S"):
-                US = self.U @ np.diag(self.S)
-
-            with TaskTimer(self.task_durations, "QR concatenate"):
-                A = np.hstack((US, X_augmented))
+            with TaskTimer(self.task_durations, "scale U by S"):
+                self.xp.multiply(self.U, self.S, out=A[:, :q])
 
             with TaskTimer(self.task_durations, "parallel QR"):
                 Q_r, U_tilde, S_tilde = self.parallel_qr(A)
 
             with TaskTimer(self.task_durations, "compute local U_prime"):
-                self.U = Q_r @ U_tilde[:, :q]
-                self.S = S_tilde[:q]
+                self.U = self.matmul(Q_r, self.to_device(U_tilde))
+                self.S = self.to_device(S_tilde)
 
             self.num_incorporated_images += m
 
@@ -329,11 +457,18 @@ class PiPCA(DimRed):
         """
         d, m = imgs.shape
 
-        mu_m = np.reshape(np.mean(imgs, axis=1), (d, 1))
-        s_m = np.zeros((d, 1))
+        # fuse the mean and variance reductions into a single pass over imgs
+        # using the sums of x and x^2, so the block is streamed once
+        xp = cupy.get_array_module(imgs) if self.use_gpu else np
+
+        s1 = imgs.sum(axis=1, keepdims=True)
+        s2 = xp.einsum("ij,ij->i", imgs, imgs).reshape(d, 1)
+
+        mu_m = s1 / m
+        s_m = xp.zeros((d, 1), dtype=imgs.dtype)
 
         if m > 1:
-            s_m = np.reshape(np.var(imgs, axis=1, ddof=1), (d, 1))
+            s_m = (s2 - m * mu_m * mu_m) / (m - 1)
 
         return mu_m, s_m
 
@@ -350,10 +485,10 @@ class PiPCA(DimRed):
         -------
         q_fin : ndarray, shape (_, q+m+1)
             Q_{r,1} from TSQR algorithm, where r = self.rank + 1
-        U_tilde : ndarray, shape (q+m+1, q+m+1)
-            Q_{r,2} from TSQR algorithm, where r = self.rank + 1
-        S_tilde : ndarray, shape (q+m+1)
-            R_tilde from TSQR algorithm, where r = self.rank + 1
+        U_tilde : ndarray, shape (q+m+1, q)
+            leading q left singular vectors of the global R factor
+        S_tilde : ndarray, shape (q)
+            leading q singular values of the global R factor
 
         Notes
         -----
@@ -378,49 +513,357 @@ class PiPCA(DimRed):
         m = x - q - 1
 
         with TaskTimer(self.task_durations, "qr - local qr"):
-            Q_r1, R_r = np.linalg.qr(A, mode="reduced")
+            Q_r1, R_r = self.local_qr(A)
+            R_r = self.to_host(R_r)
 
-        self.comm.Barrier()
+        # power-of-two rank counts admit a butterfly TSQR merge that
+        # leaves every rank holding the global R factor and its own block
+        # of Q, removing the root gather/scatter/broadcast entirely
+        if self.size & (self.size - 1) == 0:
+            return self.tsqr_butterfly(Q_r1, R_r, q + m + 1)
 
         with TaskTimer(self.task_durations, "qr - r_tot gather"):
-            if self.rank == 0:
-                R = np.empty((self.size * (q + m + 1), q + m + 1))
-            else:
-                R = None
-
-            self.comm.Gather(R_r, R, root=0)
+            R = self.gather_hierarchical(R_r, q + m + 1)
 
         if self.rank == 0:
             with TaskTimer(self.task_durations, "qr - global qr"):
                 Q_2, R_tilde = np.linalg.qr(R, mode="reduced")
 
             with TaskTimer(self.task_durations, "qr - global svd"):
-                U_tilde, S_tilde, _ = np.linalg.svd(R_tilde)
+                # svd_of_r returns just the leading q pairs, which is all
+                # that is broadcast and consumed downstream
+                U_tilde, S_tilde = self.svd_of_r(R_tilde)
         else:
-            U_tilde = np.empty((q + m + 1, q + m + 1))
-            S_tilde = np.empty(q + m + 1)
+            U_tilde = np.empty((q + m + 1, q), dtype=self.dtype)
+            S_tilde = np.empty(q, dtype=self.dtype)
             Q_2 = None
 
-        self.comm.Barrier()
+        with TaskTimer(self.task_durations, "qr - post bcasts"):
+            # post the S_tilde/U_tilde broadcasts now so their payloads
+            # travel while the scatter and the d-sized matmul below run
+            bcast_reqs = [
+                self.comm.Ibcast(S_tilde, root=0),
+                self.comm.Ibcast(U_tilde, root=0),
+            ]
 
         with TaskTimer(self.task_durations, "qr - scatter q_tot"):
-            Q_r2 = np.empty((q + m + 1, q + m + 1))
-            self.comm.Scatter(Q_2, Q_r2, root=0)
+            Q_r2 = np.empty((q + m + 1, q + m + 1), dtype=self.dtype)
+            self.scatter_hierarchical(Q_2, Q_r2, q + m + 1)
 
         with TaskTimer(self.task_durations, "qr - local matrix build"):
-            Q_r = Q_r1 @ Q_r2
+            Q_r = self.matmul(Q_r1, self.to_device(Q_r2))
 
-        self.comm.Barrier()
+        with TaskTimer(self.task_durations, "qr - wait bcasts"):
+            MPI.Request.Waitall(bcast_reqs)
+
+        return Q_r, U_tilde, S_tilde
 
-        with TaskTimer(self.task_durations, "qr - bcast S_tilde"):
-            self.comm.Bcast(S_tilde, root=0)
+    def tsqr_butterfly(self, Q_r1, R_r, k):
+        """
+        Merge local QR factors with a butterfly (all-reduce style) TSQR.
 
-        self.comm.Barrier()
+        At each of log2(size) levels, paired ranks exchange their current
+        R factors, both compute the QR of the identically stacked pair, and
+        each keeps the row block of the merge Q corresponding to its
+        position in the stack. Afterwards every rank holds the global R
+        factor and its own block of the global Q, so the SVD of R is
+        computed redundantly on all ranks and no root gather, scatter or
+        broadcast is required.
 
-        with TaskTimer(self.task_durations, "qr - bcast U_tilde"):
-            self.comm.Bcast(U_tilde, root=0)
+        Parameters
+        ----------
+        Q_r1 : ndarray, shape (_ x k)
+            local Q factor from the initial reduced QR
+        R_r : ndarray, shape (k x k)
+            local R factor from the initial reduced QR
+        k : int
+            column count of the factored matrix, q+m+1
 
-        return Q_r, U_tilde, S_tilde
+        Returns
+        -------
+        q_fin : ndarray, shape (_, k)
+            this rank's block of the global Q factor
+        U_tilde : ndarray, shape (k, q)
+            leading q left singular vectors of the global R factor
+        S_tilde : ndarray, shape (q)
+            leading q singular values of the global R factor
+
+        Notes
+        -----
+        Communication-avoiding QR merge tree from [1], arranged as a
+        butterfly so the final R is replicated on all ranks.
+
+        References
+        ----------
+        [1] Demmel J, Grigori L, Hoemmen M, Langou J. Communication-optimal
+        parallel and sequential QR and LU factorizations. SIAM Journal on
+        Scientific Computing. 2012;34(1):A206-39.
+        """
+        Q_loc = Q_r1
+        R_loc = R_r
+        R_partner = np.empty((k, k), dtype=self.dtype)
+        stacked = np.empty((2 * k, k), dtype=self.dtype)
+
+        with TaskTimer(self.task_durations, "qr - butterfly merge"):
+            level = 1
+            while level < self.size:
+                partner = self.rank ^ level
+
+                self.comm.Sendrecv(
+                    R_loc, dest=partner, recvbuf=R_partner, source=partner
+                )
+
+                # both partners stack lower rank on top, so they factor the
+                # same matrix and keep complementary row blocks of Q
+                if self.rank < partner:
+                    stacked[:k] = R_loc
+                    stacked[k:] = R_partner
+                    rows = slice(0, k)
+                else:
+                    stacked[:k] = R_partner
+                    stacked[k:] = R_loc
+                    rows = slice(k, 2 * k)
+
+                Q_merge, R_loc = np.linalg.qr(stacked, mode="reduced")
+                Q_loc = self.matmul(
+                    Q_loc, self.to_device(np.ascontiguousarray(Q_merge[rows]))
+                )
+
+                level <<= 1
+
+        with TaskTimer(self.task_durations, "qr - butterfly svd"):
+            U_tilde, S_tilde = self.svd_of_r(R_loc)
+
+        return Q_loc, U_tilde, S_tilde
+
+    def svd_of_r(self, R):
+        """
+        Compute the leading q singular pairs of the small merged R factor.
+
+        Only S_tilde[:q] and U_tilde[:, :q] are consumed by the model
+        update, so rather than a full SVD this forms the (q+m+1)^2 Gram
+        matrix B = R.T @ R and asks the symmetric eigensolver for just
+        its top q eigenpairs; the left singular vectors are recovered as
+        R @ V / s. If the selected spectrum is degenerate (e.g. the first
+        update of an unprimed model, where the U*S block is zero), the
+        recovery division is ill-posed and we fall back to gesdd.
+
+        All work is done in float64 regardless of the model storage
+        dtype -- R is small so the upcast is cheap, and it offsets the
+        squared conditioning of the Gram matrix. Results are returned in
+        the storage dtype.
+
+        Parameters
+        ----------
+        R : ndarray, shape (k x k)
+            merged R factor from TSQR
+
+        Returns
+        -------
+        U_tilde : ndarray, shape (k x q)
+            leading q left singular vectors of R
+        S_tilde : ndarray, shape (q)
+            leading q singular values of R
+        """
+        q = self.num_components
+        k = R.shape[0]
+
+        R64 = np.ascontiguousarray(R, dtype=np.float64)
+        B = R64.T @ R64
+
+        w, V = eigh(
+            B,
+            subset_by_index=[k - q, k - 1],
+            driver="evr",
+            overwrite_a=True,
+            check_finite=False,
+        )
+
+        # eigh returns ascending eigenvalues; flip to descending order
+        w = w[::-1]
+        V = V[:, ::-1]
+
+        if w[-1] > k * np.finfo(np.float64).eps * w[0]:
+            S_tilde = np.sqrt(w)
+            U_tilde = (R64 @ V) / S_tilde
+        else:
+            U_tilde, S_tilde, _ = scipy_svd(
+                R64,
+                full_matrices=False,
+                overwrite_a=True,
+                check_finite=False,
+                lapack_driver="gesdd",
+            )
+            U_tilde = U_tilde[:, :q]
+            S_tilde = S_tilde[:q]
+
+        return (
+            np.ascontiguousarray(U_tilde, dtype=self.dtype),
+            np.ascontiguousarray(S_tilde, dtype=self.dtype),
+        )
+
+    def local_qr(self, A):
+        """
+        Reduced QR factorization of the local (local_d x q+m+1) block.
+
+        On the CPU this binds LAPACK's geqrf/orgqr directly and caches
+        their optimal workspace sizes, which NumPy would otherwise query
+        and allocate on every call; the block shape is fixed in steady
+        state so the cache is hit on every update. The Fortran-ordered
+        input buffer is factored in place (its contents are rebuilt each
+        update anyway). On the GPU, cupy's QR is used as is.
+
+        Parameters
+        ----------
+        A : ndarray, shape (local_d x q+m+1)
+            local block to factorize; overwritten on the CPU path
+
+        Returns
+        -------
+        Q : ndarray, shape (local_d x q+m+1)
+            orthonormal factor
+        R : ndarray, shape (q+m+1 x q+m+1)
+            upper triangular factor
+        """
+        if self.use_gpu:
+            return cupy.linalg.qr(A, mode="reduced")
+
+        local_d, k = A.shape
+
+        if local_d < k or not A.flags.f_contiguous:
+            return np.linalg.qr(A, mode="reduced")
+
+        if self._lapack_qr_shape != (local_d, k):
+            geqrf, orgqr = get_lapack_funcs(("geqrf", "orgqr"), (A,))
+
+            # LAPACK workspace queries, cached until the shape changes
+            lwork_geqrf = int(geqrf(A, lwork=-1, overwrite_a=False)[2][0].real)
+            qr_mat, tau, _, _ = geqrf(A, lwork=lwork_geqrf, overwrite_a=False)
+            lwork_orgqr = int(orgqr(qr_mat, tau, lwork=-1)[1][0].real)
+
+            self._lapack_qr = (geqrf, orgqr, lwork_geqrf, lwork_orgqr)
+            self._lapack_qr_shape = (local_d, k)
+
+        geqrf, orgqr, lwork_geqrf, lwork_orgqr = self._lapack_qr
+
+        qr_mat, tau, _, _ = geqrf(A, lwork=lwork_geqrf, overwrite_a=True)
+        R = np.triu(qr_mat[:k, :k])
+        Q, _, _ = orgqr(qr_mat, tau, lwork=lwork_orgqr)
+
+        return Q, R
+
+    def to_host(self, arr):
+        """
+        Return arr as a host ndarray, copying from the device if needed.
+        """
+        if self.use_gpu:
+            return cupy.asnumpy(arr)
+
+        return arr
+
+    def to_device(self, arr):
+        """
+        Return arr on the compute device; a no-op on the CPU backend.
+        """
+        if self.use_gpu:
+            return cupy.asarray(arr)
+
+        return arr
+
+    def matmul(self, a, b):
+        """
+        Backend-appropriate matrix product: cuBLAS on the GPU, the cached
+        BLAS gemm handle on the CPU.
+        """
+        if self.use_gpu:
+            return a @ b
+
+        return self._gemm(1.0, a, b)
+
+    def gather_hierarchical(self, block, k):
+        """
+        Gather equally sized (k x k) blocks from all ranks onto the root
+        process in two stages: within each node onto the node leader, then
+        across node leaders onto the global root.
+
+        Parameters
+        ----------
+        block : ndarray, shape (k x k)
+            local block to contribute to the gather
+
+        k : int
+            block dimension
+
+        Returns
+        -------
+        stacked : ndarray, shape (size*k x k) or None
+            vertically stacked blocks on the root process, None elsewhere.
+            Blocks are ordered by node, then by rank within each node.
+        """
+        node_buf = None
+        if self._node_rank == 0:
+            node_buf = np.empty((self._node_size * k, k), dtype=self.dtype)
+
+        self._node_comm.Gather(block, node_buf, root=0)
+
+        stacked = None
+        if self._node_rank == 0:
+            if self._leader_comm.Get_rank() == 0:
+                stacked = np.empty((self.size * k, k), dtype=self.dtype)
+
+            counts = self._node_sizes * k * k
+            displs = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            self._leader_comm.Gatherv(
+                node_buf, [stacked, counts, displs, self.mpi_dtype], root=0
+            )
+
+        return stacked
+
+    def scatter_hierarchical(self, stacked, block, k):
+        """
+        Scatter a stack of (k x k) blocks from the root process, reversing
+        the two-stage path of gather_hierarchical so each rank receives the
+        block at the position its contribution occupied in the stack.
+
+        Parameters
+        ----------
+        stacked : ndarray, shape (size*k x k) or None
+            vertically stacked blocks on the root process, None elsewhere
+
+        block : ndarray, shape (k x k)
+            preallocated local receive buffer
+
+        k : int
+            block dimension
+        """
+        node_buf = None
+        if self._node_rank == 0:
+            node_buf = np.empty((self._node_size * k, k), dtype=self.dtype)
+
+            counts = self._node_sizes * k * k
+            displs = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            if self._leader_comm.Get_rank() == 0:
+                stacked = np.ascontiguousarray(stacked, dtype=self.dtype)
+            self._leader_comm.Scatterv(
+                [stacked, counts, displs, self.mpi_dtype], node_buf, root=0
+            )
+
+        self._node_comm.Scatter(node_buf, block, root=0)
+
+    def bcast_hierarchical(self, buf):
+        """
+        Broadcast a contiguous buffer from the root process via node
+        leaders, then within each node over shared memory.
+
+        Parameters
+        ----------
+        buf : ndarray
+            buffer to broadcast, valid on the root process
+        """
+        if self._node_rank == 0:
+            self._leader_comm.Bcast(buf, root=0)
+
+        self._node_comm.Bcast(buf, root=0)
 
     def update_sample_mean(self, mu_n, mu_m, n, m):
         """
@@ -445,7 +888,11 @@ class PiPCA(DimRed):
         mu_nm = mu_m
 
         if n != 0:
-            mu_nm = (1 / (n + m)) * (n * mu_n + m * mu_m)
+            if njit is not None and not self.use_gpu:
+                mu_nm = np.empty_like(mu_m)
+                _combine_sample_mean(mu_n, mu_m, n, m, mu_nm)
+            else:
+                mu_nm = (1 / (n + m)) * (n * mu_n + m * mu_m)
 
         return mu_nm
 
@@ -478,8 +925,12 @@ class PiPCA(DimRed):
         s_nm = s_m
 
         if n != 0:
-            s_nm = (((n - 1) * s_n + (m - 1) * s_m)
-                    + (n * m * (mu_n - mu_m) ** 2) / (n + m)) / (n + m - 1)
+            if njit is not None and not self.use_gpu:
+                s_nm = np.empty_like(s_m)
+                _combine_sample_variance(s_n, s_m, mu_n, mu_m, n, m, s_nm)
+            else:
+                s_nm = (((n - 1) * s_n + (m - 1) * s_m)
+                        + (n * m * (mu_n - mu_m) ** 2) / (n + m)) / (n + m - 1)
 
         return s_nm
 
@@ -499,21 +950,21 @@ class PiPCA(DimRed):
             Sample data variance computed from all input images.
         """
         if self.rank == 0:
-            U_tot = np.empty(self.num_features * self.num_components)
-            mu_tot = np.empty((self.num_features, 1))
-            var_tot = np.empty((self.num_features, 1))
+            U_tot = np.empty(self.num_features * self.num_components, dtype=self.dtype)
+            mu_tot = np.empty((self.num_features, 1), dtype=self.dtype)
+            var_tot = np.empty((self.num_features, 1), dtype=self.dtype)
         else:
             U_tot, mu_tot, var_tot = None, None, None
 
         start_indices = self.split_indices[:-1]
 
         self.comm.Gatherv(
-            self.U.flatten(),
+            np.ascontiguousarray(self.to_host(self.U)).ravel(),
             [
                 U_tot,
                 self.split_counts * self.num_components,
                 start_indices * self.num_components,
-                MPI.DOUBLE,
+                self.mpi_dtype,
             ],
             root=0,
         )
@@ -522,22 +973,22 @@ class PiPCA(DimRed):
             U_tot = np.reshape(U_tot, (self.num_features, self.num_components))
 
         self.comm.Gatherv(
-            self.mu,
+            np.ascontiguousarray(self.to_host(self.mu)),
             [
                 mu_tot,
-                self.split_counts * self.num_components,
+                self.split_counts,
                 start_indices,
-                MPI.DOUBLE,
+                self.mpi_dtype,
             ],
             root=0,
         )
         self.comm.Gatherv(
-            self.total_variance,
+            np.ascontiguousarray(self.to_host(self.total_variance)),
             [
                 var_tot,
-                self.split_counts * self.num_components,
+                self.split_counts,
                 start_indices,
-                MPI.DOUBLE,
+                self.mpi_dtype,
             ],
             root=0,
         )
@@ -567,6 +1018,8 @@ class PiPCA(DimRed):
         q_sig : int
             The q_sig components used in generating the loadings for 
         """
+        X = self.to_host(X)
+
         _, m = X.shape
         n, d = self.num_incorporated_images, self.num_features
 
@@ -575,17 +1028,17 @@ class PiPCA(DimRed):
         U, _, mu, _ = self.get_model()
 
         if self.rank == 0:
-            X_tot = np.empty((d, m))
+            X_tot = np.empty((d, m), dtype=self.dtype)
         else:
             X_tot = None
 
         self.comm.Gatherv(
-            X.flatten(),
+            np.ascontiguousarray(X).ravel(),
             [
                 X_tot,
                 self.split_counts * m,
                 start_indices * m,
-                MPI.DOUBLE,
+                self.mpi_dtype,
             ],
             root=0,
         )
@@ -593,7 +1046,7 @@ class PiPCA(DimRed):
         if self.rank == 0:
 
             X_tot = np.reshape(X_tot, (d, m))
-            cb = X_tot - np.tile(mu, (1, m))
+            cb = X_tot - mu
 
             pcs = U.T @ cb
             self.pc_data = (
@@ -776,21 +1229,11 @@ def distribute_indices_over_ranks(d, size):
         number of dimensions allocated per rank
     """
 
-    total_indices = 0
-    split_indices, split_counts = [0], []
-
-    for r in range(size):
-        num_per_rank = d // size
-        if r < (d % size):
-            num_per_rank += 1
-
-        split_counts.append(num_per_rank)
-
-        total_indices += num_per_rank
-        split_indices.append(total_indices)
+    split_counts = np.full(size, d // size, dtype=np.int64)
+    split_counts[: d % size] += 1
 
-    split_indices = np.array(split_indices)
-    split_counts = np.array(split_counts)
+    split_indices = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(split_counts, out=split_indices[1:])
 
     return split_indices, split_counts
 